@@ -1,20 +1,43 @@
-import tkinter as tk
-from tkinter import ttk, messagebox
+import atexit
 import csv
+import os
+import re
+import warnings
+import weakref
+from collections import Counter
 from datetime import datetime
 
-# Verificar que scikit-learn esté disponible
+import pandas as pd
+
+# pyahocorasick es opcional; sin él se usa una expresión regular compilada
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# pyarrow es opcional; si está, pandas usa su lector CSV nativo
 try:
-    from sklearn.tree import DecisionTreeClassifier
-    from sklearn.preprocessing import LabelEncoder
+    import pyarrow
 except ImportError:
-    raise ImportError("scikit-learn no está instalado. Ejecuta 'pip install scikit-learn' para usar árboles de decisión.")
+    pyarrow = None
+
+_WORD_RE = re.compile(r'\w+')
+
+# Gestores vivos; se cierran al salir sin que atexit los mantenga en memoria
+_open_managers = weakref.WeakSet()
+
+@atexit.register
+def _close_open_managers():
+    for manager in list(_open_managers):
+        manager.close()
 
 class TicketManager:
+    # Campos de cada ticket, en el orden en que se guardan en el CSV
+    FIELDNAMES = ('nombre', 'categoria', 'prioridad', 'descripcion', 'fecha', 'estado')
+
     def __init__(self, csv_file='tickets.csv'):
         # Archivo donde se almacenan los tickets
         self.csv_file = csv_file
-        self.tickets = []
         # Vocabulario manual ampliado para clasificación
         self.category_keywords = {
             'agua': {'fuga', 'inundación', 'desborde', 'filtración', 'derrame', 'humedad'},
@@ -38,113 +61,221 @@ class TicketManager:
             'limpieza': 'Baja',
             'otro': 'Media'
         }
-        # Preparar datos sintéticos y entrenar árboles
-        self._prepare_dataset()
-        self._train_classification_tree()
-        self._train_priority_tree()
+        # Archivo y escritor CSV que append_ticket mantiene abiertos
+        self._csv_fh = None
+        self._csv_writer = None
+        _open_managers.add(self)
         # Cargar tickets existentes
         self.cargar_tickets()
+        # Ordenar categorías por frecuencia histórica y preparar el buscador
+        self._order_categories()
+        self._kw_to_cat = {kw: cat for cat, kws in self.category_keywords.items() for kw in kws}
+        self._build_matcher()
+
+    def _order_categories(self):
+        """
+        Reordena category_keywords de la categoría más frecuente en el
+        historial a la menos frecuente (las ausentes conservan su orden) y
+        actualiza _cat_rank. Se calcula una vez al cargar; después
+        append_ticket mantiene el conteo con _count_category.
+        """
+        self._cat_counts = Counter(self.tickets['categoria']) if 'categoria' in self.tickets else Counter()
+        self._cat_order = sorted(self.category_keywords, key=lambda cat: -self._cat_counts[cat])
+        self.category_keywords = {cat: self.category_keywords[cat] for cat in self._cat_order}
+        self._cat_rank = {cat: i for i, cat in enumerate(self._cat_order)}
 
-    def _prepare_dataset(self):
-        """
-        Genera un dataset sintético a partir de category_keywords.
-        Construye X (features) y y_cat, y_prio.
-        """
-        # Listado de todas las palabras clave como vocabulario
-        self.features = sorted({kw for kws in self.category_keywords.values() for kw in kws})
-        descriptions, y_cat, y_prio = [], [], []
-        # Plantillas para generar oraciones
-        templates = [
-            "Se detecta {kw} en la instalación.",
-            "Hay un reporte de {kw} hace minutos.",
-            "Se percibe {kw} cerca del área común.",
-            "Alerta: posible {kw} en el sector.",
-        ]
-        for category, kws in self.category_keywords.items():
-            for kw in kws:
-                for tmpl in templates:
-                    desc = tmpl.format(kw=kw)
-                    descriptions.append(desc)
-                    y_cat.append(category)
-                    y_prio.append(self.priority_map.get(category, 'Media'))
-        # Construir matriz de bits (Bag of Words)
-        self.X = []
-        for desc in descriptions:
-            vec = [1 if kw in desc.lower() else 0 for kw in self.features]
-            self.X.append(vec)
-        self.y_cat = y_cat
-        self.y_prio = y_prio
-
-    def _train_classification_tree(self):
-        """
-        Entrena el árbol de decisión para clasificar categorías.
-        """
-        self.le_cat = LabelEncoder()
-        y = self.le_cat.fit_transform(self.y_cat)
-        clf = DecisionTreeClassifier()
-        clf.fit(self.X, y)
-        self.clf_cat = clf
-
-    def _train_priority_tree(self):
-        """
-        Entrena el árbol de decisión para predecir prioridades.
-        """
-        self.le_prio = LabelEncoder()
-        y = self.le_prio.fit_transform(self.y_prio)
-        clf = DecisionTreeClassifier()
-        clf.fit(self.X, y)
-        self.clf_prio = clf
+    def _count_category(self, category):
+        """
+        Suma un ticket a category y la sube en el ranking solo mientras
+        supere a la categoría inmediatamente superior.
+        """
+        self._cat_counts[category] += 1
+        rank = self._cat_rank.get(category)
+        if rank is None:
+            return
+        order = self._cat_order
+        start = rank
+        while rank > 0 and self._cat_counts[category] > self._cat_counts[order[rank - 1]]:
+            above = order[rank - 1]
+            order[rank - 1], order[rank] = category, above
+            self._cat_rank[above] = rank
+            rank -= 1
+        if rank != start:
+            self._cat_rank[category] = rank
+            self.category_keywords = {cat: self.category_keywords[cat] for cat in order}
+
+    def _build_matcher(self):
+        """
+        Construye los buscadores de palabras clave a partir de _kw_to_cat.
+        Las claves de una sola palabra se buscan por intersección de
+        conjuntos y las de varias palabras con _phrase_matcher; si ninguna
+        coincide, _kw_matcher busca cualquier clave como subcadena, para
+        formas flexionadas ('fugas', 'incendios').
+        """
+        self._all_kw = {kw for kw in self._kw_to_cat if _WORD_RE.fullmatch(kw)}
+        self._phrase_matcher = self._compile_matcher(
+            [kw for kw in self._kw_to_cat if kw not in self._all_kw])
+        self._kw_matcher = self._compile_matcher(list(self._kw_to_cat))
+
+    def _compile_matcher(self, keywords):
+        """
+        Devuelve un autómata Aho-Corasick si está disponible y, si no, una
+        alternancia regex con las claves largas primero. None si no hay claves.
+        """
+        if not keywords:
+            return None
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for kw in keywords:
+                automaton.add_word(kw, kw)
+            automaton.make_automaton()
+            return automaton
+        return re.compile('|'.join(
+            re.escape(kw) for kw in sorted(keywords, key=len, reverse=True)))
+
+    def _scan(self, matcher, desc):
+        """
+        Devuelve el conjunto de palabras clave de matcher presentes en desc.
+        """
+        if matcher is None:
+            return set()
+        if ahocorasick is not None:
+            return {kw for _, kw in matcher.iter(desc)}
+        return {m.group(0) for m in matcher.finditer(desc)}
 
     def cargar_tickets(self):
         """
-        Carga los tickets existentes desde un archivo CSV.
-        Si no existe, inicializa lista vacía.
+        Carga los tickets existentes desde un archivo CSV en un DataFrame
+        (una columna por campo). Si no existe o está vacío, lo deja vacío.
         """
-        try:
-            with open(self.csv_file, mode='r', newline='', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                self.tickets = list(reader)
-        except FileNotFoundError:
-            self.tickets = []
+        self._close_writer()
+        self.tickets = None
+        if os.path.isfile(self.csv_file) and os.path.getsize(self.csv_file) > 0:
+            # Filas con campos de más: pyarrow lanza ParserError; el motor C
+            # las recorta con un aviso (index_col=False impide que tome la
+            # primera columna como índice) y ese aviso se trata como error.
+            # En ambos casos se relee con _read_malformed_csv.
+            if pyarrow is not None:
+                options = {'engine': 'pyarrow'}
+            else:
+                options = {'engine': 'c', 'index_col': False}
+            with warnings.catch_warnings():
+                warnings.simplefilter('error', pd.errors.ParserWarning)
+                try:
+                    self.tickets = pd.read_csv(self.csv_file, dtype=str, keep_default_na=False,
+                                               encoding='utf-8', **options)
+                except pd.errors.EmptyDataError:
+                    pass
+                except (pd.errors.ParserError, pd.errors.ParserWarning):
+                    self.tickets = self._read_malformed_csv()
+        # Archivo sin cabecera útil (solo espacios o líneas en blanco): vacío.
+        # Si existe con contenido, el primer ticket lo reescribe con cabecera
+        self._needs_header = False
+        if self.tickets is None or (self.tickets.empty and
+                                    not any(str(c).strip() for c in self.tickets.columns)):
+            self.tickets = pd.DataFrame(columns=list(self.FIELDNAMES), dtype=str)
+            self._needs_header = os.path.isfile(self.csv_file) and os.path.getsize(self.csv_file) > 0
+        self._fieldnames = list(self.tickets.columns)
+
+    def _read_malformed_csv(self):
+        """
+        Relee con el módulo csv un archivo con filas mal formadas sin perder
+        ninguna: los campos de más (p. ej. una coma sin comillas en la
+        descripción) se unen en la última columna y los que faltan quedan
+        como ''. Así una reescritura con guardar_tickets conserva el texto.
+        """
+        with open(self.csv_file, mode='r', newline='', encoding='utf-8') as f:
+            rows = [row for row in csv.reader(f) if row]
+        if not rows:
+            return None
+        header, n = rows[0], len(rows[0])
+        data = [row[:n - 1] + [','.join(row[n - 1:])] if len(row) > n
+                else row + [''] * (n - len(row)) for row in rows[1:]]
+        return pd.DataFrame(data, columns=header, dtype=str)
 
     def guardar_tickets(self):
         """
-        Guarda la lista de tickets en el archivo CSV con todas las cabeceras.
+        Guarda todos los tickets en el archivo CSV con todas las cabeceras.
         """
-        if not self.tickets:
+        self._close_writer()
+        if self.tickets.empty:
             return
-        all_fields = []
-        for ticket in self.tickets:
-            for key in ticket.keys():
-                if key not in all_fields:
-                    all_fields.append(key)
-        with open(self.csv_file, mode='w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=all_fields)
-            writer.writeheader()
-            rows = [{field: ticket.get(field, '') for field in all_fields}
-                    for ticket in self.tickets]
-            writer.writerows(rows)
+        self.tickets.to_csv(self.csv_file, index=False, encoding='utf-8', lineterminator='\n')
+        self._fieldnames = list(self.tickets.columns)
+        self._needs_header = False
+
+    def append_ticket(self, ticket):
+        """
+        Agrega un ticket a self.tickets y al final del CSV sin reescribir
+        el archivo. El archivo queda abierto entre llamadas y cada fila se
+        vacía a disco al escribirla. Si el ticket trae campos nuevos, o el
+        archivo cargado no tenía cabecera, reescribe todo con guardar_tickets.
+        """
+        if self._needs_header or set(ticket) - set(self._fieldnames):
+            self.tickets = pd.concat([self.tickets, pd.DataFrame([ticket], dtype=str)],
+                                     ignore_index=True).fillna('')
+            self.guardar_tickets()
+            self._count_category(ticket.get('categoria', ''))
+            return
+        # Completar campos faltantes con '' igual que en el CSV, no con NaN
+        row = {field: ticket.get(field, '') for field in self._fieldnames}
+        self.tickets.loc[len(self.tickets)] = row
+        if self._csv_writer is None:
+            write_header = not os.path.exists(self.csv_file) or os.path.getsize(self.csv_file) == 0
+            self._csv_fh = open(self.csv_file, mode='a', newline='', encoding='utf-8')
+            self._csv_writer = csv.DictWriter(self._csv_fh, fieldnames=self._fieldnames,
+                                              restval='', lineterminator='\n')
+            if write_header:
+                self._csv_writer.writeheader()
+        self._csv_writer.writerow(row)
+        self._csv_fh.flush()
+        self._count_category(ticket.get('categoria', ''))
+
+    def _close_writer(self):
+        """
+        Vacía y cierra el archivo abierto por append_ticket, si lo hay.
+        """
+        if self._csv_fh is not None:
+            self._csv_fh.close()
+            self._csv_fh = None
+            self._csv_writer = None
+
+    def close(self):
+        """
+        Cierra el archivo de tickets abierto, si lo hay. run() la llama al
+        terminar; en uso por script conviene llamarla explícitamente.
+        """
+        self._close_writer()
 
     def classify_ticket(self, description):
         """
-        Usa árbol de decisión entrenado para asignar categoría.
+        Asigna la categoría según las palabras clave de la descripción.
         """
-        vec = [1 if kw in description.lower() else 0 for kw in self.features]
-        idx = self.clf_cat.predict([vec])[0]
-        return self.le_cat.inverse_transform([idx])[0]
+        desc = (description or '').lower()
+        hits = set(_WORD_RE.findall(desc)) & self._all_kw
+        hits |= self._scan(self._phrase_matcher, desc)
+        if not hits:
+            hits = self._scan(self._kw_matcher, desc)
+        if not hits:
+            return 'otro'
+        if len(hits) == 1:
+            return self._kw_to_cat[hits.pop()]
+        # Varias coincidencias: gana la categoría más frecuente
+        return min((self._kw_to_cat[kw] for kw in hits), key=self._cat_rank.__getitem__)
 
     def prioritize_ticket(self, category, description=None):
         """
-        Usa árbol de decisión entrenado para asignar prioridad.
+        Asigna la prioridad correspondiente a la categoría.
         """
-        vec = [1 if kw in (description or '').lower() else 0 for kw in self.features]
-        idx = self.clf_prio.predict([vec])[0]
-        return self.le_prio.inverse_transform([idx])[0]
+        return self.priority_map.get(category, 'Media')
 
     def crear_ticket(self):
         """
-        Abre ventana para ingresar un ticket; aplica árboles de decisión para IA.
+        Abre ventana para ingresar un ticket; clasifica y prioriza automáticamente.
         """
+        import tkinter as tk
+        from tkinter import messagebox
+
         ventana = tk.Toplevel(self.root)
         ventana.title("Nuevo Ticket")
 
@@ -172,8 +303,7 @@ class TicketManager:
                 'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                 'estado': 'Pendiente'
             }
-            self.tickets.append(ticket)
-            self.guardar_tickets()
+            self.append_ticket(ticket)
             messagebox.showinfo("Éxito", f"Ticket generado. Categoría: {categoria}, Prioridad: {prioridad}.")
             ventana.destroy()
 
@@ -183,31 +313,37 @@ class TicketManager:
         """
         Muestra todos los tickets con categoría y prioridad.
         """
+        import tkinter as tk
+        from tkinter import ttk
+
         ventana = tk.Toplevel(self.root)
         ventana.title("Historial de Tickets")
-        cols = ['nombre', 'categoria', 'prioridad', 'descripcion', 'fecha', 'estado']
+        cols = self.FIELDNAMES
         tree = ttk.Treeview(ventana, columns=cols, show='headings')
         for col in cols:
             tree.heading(col, text=col.capitalize())
             tree.column(col, width=100)
         tree.pack(fill=tk.BOTH, expand=True)
 
-        for t in self.tickets:
-            tree.insert('', tk.END, values=[t.get(c, '') for c in cols])
+        # Un solo cruce Python -> Tcl: foreach inserta todas las filas. Corre
+        # dentro de apply para que 'row' sea local y no quede como global
+        rows = tuple(self.tickets.reindex(columns=cols, fill_value='')
+                     .itertuples(index=False, name=None))
+        tree.tk.call('apply', f'{{rows}} {{foreach row $rows {{{tree} insert {{}} end -values $row}}}}',
+                     rows)
 
     def generar_reporte(self):
         """
         Muestra estadísticas de tickets por categoría y prioridad.
         """
+        from tkinter import messagebox
+
         total = len(self.tickets)
         if total == 0:
             messagebox.showwarning("Sin datos", "No hay tickets para reporte.")
             return
-        stats_cat = {}
-        stats_prio = {}
-        for t in self.tickets:
-            stats_cat[t['categoria']] = stats_cat.get(t['categoria'], 0) + 1
-            stats_prio[t['prioridad']] = stats_prio.get(t['prioridad'], 0) + 1
+        stats_cat = self.tickets['categoria'].value_counts()
+        stats_prio = self.tickets['prioridad'].value_counts()
         reporte = f"Total de tickets: {total}\n\nTickets por categoría:\n"
         for cat, cnt in stats_cat.items():
             reporte += f"- {cat}: {cnt}\n"
@@ -220,6 +356,8 @@ class TicketManager:
         """
         Configura la ventana principal y menús.
         """
+        import tkinter as tk
+
         self.root = tk.Tk()
         self.root.title("Agente de Gestión de Tickets Avanzado")
         self.root.geometry('600x400')
@@ -240,7 +378,10 @@ class TicketManager:
         Inicia la aplicación.
         """
         self.setup_ui()
-        self.root.mainloop()
+        try:
+            self.root.mainloop()
+        finally:
+            self.close()
 
 if __name__ == "__main__":
     manager = TicketManager()